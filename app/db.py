@@ -1,157 +1,302 @@
 """
-Supabase database client with async operations.
+Postgres database client backed by an asyncpg connection pool.
 """
 import os
+import time
 from typing import List, Optional, Dict, Any
-from datetime import datetime
-from supabase import create_client, Client
-from dotenv import load_dotenv
+from uuid import uuid4
+import asyncpg
 
 from app.models import SessionCreate, SessionUpdate, EventCreate, Event
 
-# Load environment variables
-load_dotenv()
-
 
 class Database:
-    """Async Supabase database client."""
-    
-    _instance = None
-    
+    """Async Postgres database client with pooled connections."""
+
+    # How long cached session rows stay fresh
+    SESSION_CACHE_TTL = 5.0
+
     def __init__(self):
-        """Initialize Supabase client."""
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_KEY")
-        
-        if not supabase_url or not supabase_key:
-            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment")
-        
-        self.client: Client = create_client(supabase_url, supabase_key)
-    
+        """Read connection settings; the pool is created in connect()."""
+        dsn = os.getenv("SUPABASE_DB_URL")
+
+        if not dsn:
+            raise ValueError("SUPABASE_DB_URL must be set in environment")
+
+        self.dsn = dsn
+        self.pool: Optional[asyncpg.Pool] = None
+
+        # Short-TTL cache of session rows keyed by session_id, so the
+        # summarize-right-after-disconnect path skips a read of the row
+        # we wrote at connect time
+        self._session_cache: Dict[str, tuple] = {}
+
+    async def connect(self) -> None:
+        """
+        Create the connection pool.
+
+        Must be awaited once at application startup before any queries run.
+        """
+        if self.pool is not None:
+            return
+
+        self.pool = await asyncpg.create_pool(
+            dsn=self.dsn,
+            min_size=10,
+            max_size=50,
+            max_inactive_connection_lifetime=300,
+            command_timeout=60,
+            # Supabase's transaction pooler (pgbouncer on port 6543) does not
+            # support named prepared statements; disable the statement cache
+            # and randomize statement names so pooled connections stay safe.
+            statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+        )
+
+    async def close(self) -> None:
+        """Close the connection pool."""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
     async def create_session(self, session: SessionCreate) -> Dict[str, Any]:
         """
         Create a new session in the database.
-        
+
         Args:
             session: Session creation data
-            
+
         Returns:
             Created session data
         """
         try:
-            result = self.client.table("sessions").insert({
-                "session_id": session.session_id,
-                "user_id": session.user_id,
-                "start_time": datetime.utcnow().isoformat()
-            }).execute()
-            
-            return result.data[0] if result.data else {}
+            async with self.pool.acquire() as conn:
+                row = await conn.fetchrow(
+                    """
+                    INSERT INTO sessions (session_id, user_id, start_time)
+                    VALUES ($1, $2, now())
+                    RETURNING *
+                    """,
+                    session.session_id,
+                    session.user_id,
+                )
+
+            created = dict(row) if row else {}
+            if created:
+                self._session_cache[session.session_id] = (time.monotonic(), created)
+            return created
         except Exception as e:
             raise Exception(f"Failed to create session: {str(e)}")
-    
+
     async def update_session(self, session_id: str, update: SessionUpdate) -> Dict[str, Any]:
         """
         Update session metadata.
-        
+
         Args:
             session_id: Session identifier
             update: Update data
-            
+
         Returns:
             Updated session data
         """
         try:
             update_data = {}
             if update.end_time:
-                update_data["end_time"] = update.end_time.isoformat()
+                update_data["end_time"] = update.end_time
             if update.duration_seconds is not None:
                 update_data["duration_seconds"] = update.duration_seconds
             if update.summary:
                 update_data["summary"] = update.summary
-            
-            result = self.client.table("sessions").update(update_data).eq(
-                "session_id", session_id
-            ).execute()
-            
-            return result.data[0] if result.data else {}
+
+            if not update_data:
+                return {}
+
+            assignments = ", ".join(
+                f"{column} = ${i}" for i, column in enumerate(update_data, start=2)
+            )
+
+            async with self.pool.acquire() as conn:
+                row = await conn.fetchrow(
+                    f"UPDATE sessions SET {assignments} WHERE session_id = $1 RETURNING *",
+                    session_id,
+                    *update_data.values(),
+                )
+
+            self._session_cache.pop(session_id, None)
+            return dict(row) if row else {}
         except Exception as e:
             raise Exception(f"Failed to update session: {str(e)}")
-    
+
     async def insert_event(self, event: EventCreate) -> Dict[str, Any]:
         """
         Insert a new event (message) into the database.
-        
+
         Args:
             event: Event data
-            
+
         Returns:
             Created event data
         """
         try:
-            event_data = {
-                "session_id": event.session_id,
-                "role": event.role,
-                "content": event.content
-            }
-            
-            if event.tool_call_id:
-                event_data["tool_call_id"] = event.tool_call_id
-            if event.tool_name:
-                event_data["tool_name"] = event.tool_name
-            
-            result = self.client.table("events").insert(event_data).execute()
-            
-            return result.data[0] if result.data else {}
+            async with self.pool.acquire() as conn:
+                row = await conn.fetchrow(
+                    """
+                    INSERT INTO events (session_id, role, content, tool_call_id, tool_name)
+                    VALUES ($1, $2, $3, $4, $5)
+                    RETURNING *
+                    """,
+                    event.session_id,
+                    event.role,
+                    event.content,
+                    event.tool_call_id,
+                    event.tool_name,
+                )
+
+            return dict(row) if row else {}
         except Exception as e:
             raise Exception(f"Failed to insert event: {str(e)}")
-    
+
+    async def insert_events(self, events: List[EventCreate]) -> None:
+        """
+        Insert a batch of events in a single round trip.
+
+        Args:
+            events: Event data for each row
+        """
+        if not events:
+            return
+
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.executemany(
+                    """
+                    INSERT INTO events (session_id, role, content, tool_call_id, tool_name)
+                    VALUES ($1, $2, $3, $4, $5)
+                    """,
+                    [
+                        (e.session_id, e.role, e.content, e.tool_call_id, e.tool_name)
+                        for e in events
+                    ],
+                )
+        except Exception as e:
+            raise Exception(f"Failed to insert events: {str(e)}")
+
     async def get_session_events(self, session_id: str) -> List[Event]:
         """
         Retrieve all events for a session, ordered by creation time.
-        
+
         Args:
             session_id: Session identifier
-            
+
         Returns:
             List of events
         """
         try:
-            result = self.client.table("events").select("*").eq(
-                "session_id", session_id
-            ).order("created_at", desc=False).execute()
-            
-            return [Event(**event) for event in result.data]
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(
+                    # Batched inserts share one transaction timestamp, so
+                    # created_at alone cannot order rows within a turn;
+                    # break ties with the serial id
+                    "SELECT * FROM events WHERE session_id = $1 ORDER BY created_at ASC, id ASC",
+                    session_id,
+                )
+
+            # Rows come from our own schema with native types (asyncpg already
+            # returns tz-aware datetimes), so skip Pydantic validation
+            return [Event.model_construct(**dict(row)) for row in rows]
         except Exception as e:
             raise Exception(f"Failed to get session events: {str(e)}")
-    
+
+    async def get_session_with_events(
+        self, session_id: str
+    ) -> Optional[tuple]:
+        """
+        Fetch session start time and conversation messages in one query.
+
+        Tool-role rows are filtered out in SQL since summaries only use
+        user/assistant/system messages.
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            Tuple of (start_time, [(role, content), ...]), or None if the
+            session does not exist
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    SELECT s.start_time, e.role, e.content
+                    FROM sessions s
+                    LEFT JOIN events e
+                        ON e.session_id = s.session_id
+                        AND e.role IN ('user', 'assistant', 'system')
+                    WHERE s.session_id = $1
+                    ORDER BY e.created_at ASC, e.id ASC
+                    """,
+                    session_id,
+                )
+
+            if not rows:
+                return None
+
+            start_time = rows[0]["start_time"]
+            messages = [
+                (row["role"], row["content"])
+                for row in rows
+                if row["role"] is not None
+            ]
+            return start_time, messages
+        except Exception as e:
+            raise Exception(f"Failed to get session with events: {str(e)}")
+
     async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve session metadata.
-        
+
         Args:
             session_id: Session identifier
-            
+
         Returns:
             Session data or None
         """
+        cached = self._session_cache.get(session_id)
+        if cached and time.monotonic() - cached[0] < self.SESSION_CACHE_TTL:
+            return cached[1]
+
         try:
-            result = self.client.table("sessions").select("*").eq(
-                "session_id", session_id
-            ).execute()
-            
-            return result.data[0] if result.data else None
+            async with self.pool.acquire() as conn:
+                row = await conn.fetchrow(
+                    "SELECT * FROM sessions WHERE session_id = $1",
+                    session_id,
+                )
+
+            session = dict(row) if row else None
+            if session:
+                self._session_cache[session_id] = (time.monotonic(), session)
+            return session
         except Exception as e:
             raise Exception(f"Failed to get session: {str(e)}")
 
 
-# Lazy database initialization
+# Database instance, initialized at application startup
 _db_instance = None
 
-def get_db() -> Database:
-    """Get or create database instance."""
+
+async def init_db() -> Database:
+    """Create the database instance and its pool. Awaited once at startup."""
     global _db_instance
     if _db_instance is None:
         _db_instance = Database()
+        await _db_instance.connect()
+    return _db_instance
+
+
+def get_db() -> Database:
+    """Get the initialized database instance."""
+    if _db_instance is None:
+        raise RuntimeError("Database not initialized - call init_db() at startup")
     return _db_instance
 
 # For backward compatibility
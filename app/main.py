@@ -1,9 +1,45 @@
 """
 FastAPI application entry point.
 """
+import logging
+import logging.handlers
+import os
+import queue
+
+from dotenv import load_dotenv
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from app.websocket import websocket_endpoint
+
+# Load environment variables once, before any dependency is constructed
+load_dotenv()
+
+
+def configure_logging() -> None:
+    """
+    Route log records through a queue so the actual write happens on a
+    background thread instead of blocking the event loop.
+    """
+    log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+from app.db import init_db, get_db
+from app.llm import init_llm_handler
+from app.websocket import manager, websocket_endpoint
 
 # Create FastAPI app
 app = FastAPI(
@@ -53,16 +89,38 @@ async def websocket_route(websocket: WebSocket, session_id: str):
 @app.on_event("startup")
 async def startup_event():
     """Application startup event."""
-    print("🚀 Real-Time AI Conversation Backend started")
-    print("📡 WebSocket endpoint: /ws/session/{session_id}")
+    # Wire dependencies explicitly so nothing is lazily constructed under
+    # concurrent WebSocket connects
+    app.state.db = await init_db()
+    app.state.llm = init_llm_handler()
+    # Warm the OpenAI connection so the first turn skips the handshake
+    await app.state.llm.warm_up()
+    manager.start_writer()
+    logger.info("🚀 Real-Time AI Conversation Backend started")
+    logger.info("📡 WebSocket endpoint: /ws/session/{session_id}")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown event."""
-    print("👋 Shutting down Real-Time AI Conversation Backend")
+    await manager.stop_writer()
+    await get_db().close()
+    logger.info("👋 Shutting down Real-Time AI Conversation Backend")
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    # uvloop + httptools give a 2-4x faster event loop / HTTP parser, and
+    # multiple workers let sessions scale past one core. WebSocket sessions
+    # are sticky to one worker, so per-worker connection state stays valid.
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", 2)),
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        log_level="warning",
+    )
@@ -2,68 +2,80 @@
 Post-session processing: Generate summary and update session metadata.
 """
 import asyncio
-from datetime import datetime
-from typing import List, Dict
+import logging
+from datetime import datetime, timezone
+from typing import List, Dict, Optional
 from app.db import get_db
 from app.llm import get_llm_handler
 from app.models import SessionUpdate
 
+logger = logging.getLogger(__name__)
 
-async def process_session_summary(session_id: str) -> None:
+
+async def process_session_summary(
+    session_id: str,
+    history: Optional[List[Dict[str, str]]] = None
+) -> None:
     """
     Background job to summarize conversation and update session.
-    
+
     This runs asynchronously after WebSocket disconnect:
-    1. Fetch all events from database
+    1. Use the in-memory transcript (or rebuild it from the database)
     2. Generate summary using LLM
     3. Calculate session duration
     4. Update session record
-    
+
     Args:
         session_id: Session to process
+        history: Conversation transcript kept by the connection manager;
+            when None (e.g. after a restart) events are refetched from
+            the database
     """
     try:
-        # Fetch session metadata
-        session = await get_db().get_session(session_id)
-        if not session:
-            print(f"Session {session_id} not found")
-            return
-        
-        # Fetch all conversation events
-        events = await get_db().get_session_events(session_id)
-        
-        if not events:
-            print(f"No events found for session {session_id}")
+        if history is not None:
+            # Happy path: the transcript already lives in memory, so only
+            # the session row is needed for the start time
+            session = await get_db().get_session(session_id)
+            if not session:
+                logger.warning(f"Session {session_id} not found")
+                return
+
+            start_time = session.get("start_time")
+            # Only user/assistant messages: the system prompt is never
+            # persisted to events, and keeping it here would both waste
+            # summary input tokens and make zero-turn sessions look
+            # non-empty, triggering a pointless LLM call
+            messages = [
+                {"role": m["role"], "content": m["content"]}
+                for m in history
+                if m.get("role") in ("user", "assistant") and m.get("content")
+            ]
+        else:
+            # Fallback: fetch session metadata and conversation events in
+            # one round trip; tool-role events are filtered out in SQL
+            result = await get_db().get_session_with_events(session_id)
+            if not result:
+                logger.warning(f"Session {session_id} not found")
+                return
+
+            start_time, rows = result
+            messages = [{"role": role, "content": content} for role, content in rows]
+
+        if not messages:
+            logger.info(f"No events found for session {session_id}")
             return
-        
-        # Build conversation history for summarization
-        messages = []
-        for event in events:
-            # Skip tool-specific events in summary
-            if event.role in ["user", "assistant", "system"]:
-                messages.append({
-                    "role": event.role,
-                    "content": event.content
-                })
-        
+
         # Generate summary
-        print(f"Generating summary for session {session_id}...")
+        logger.info(f"Generating summary for session {session_id}...")
         summary = await get_llm_handler().generate_summary(messages)
         
-        # Calculate duration with timezone-aware datetimes
-        from datetime import timezone
+        # Calculate duration; asyncpg returns tz-aware datetimes for
+        # timestamptz columns, so no string parsing is needed
         end_time = datetime.now(timezone.utc)
-        start_time = session.get("start_time")
-        
-        # Parse start_time if it's a string
-        if isinstance(start_time, str):
-            # Remove timezone suffix and parse, then make it timezone-aware
-            start_time_str = start_time.replace('+00:00', '').replace('Z', '')
-            start_time = datetime.fromisoformat(start_time_str).replace(tzinfo=timezone.utc)
-        elif not start_time.tzinfo:
-            # If start_time is naive, make it timezone-aware
+
+        if start_time.tzinfo is None:
             start_time = start_time.replace(tzinfo=timezone.utc)
-        
+
         duration_seconds = int((end_time - start_time).total_seconds())
         
         # Update session
@@ -75,20 +87,24 @@ async def process_session_summary(session_id: str) -> None:
         
         await get_db().update_session(session_id, update)
         
-        print(f"Session {session_id} summary complete: {duration_seconds}s, summary: {summary[:100]}...")
+        logger.info(f"Session {session_id} summary complete: {duration_seconds}s, summary: {summary[:100]}...")
         
     except Exception as e:
-        print(f"Error processing session summary for {session_id}: {str(e)}")
+        logger.error(f"Error processing session summary for {session_id}: {str(e)}")
 
 
-def trigger_summary_job(session_id: str) -> asyncio.Task:
+def trigger_summary_job(
+    session_id: str,
+    history: Optional[List[Dict[str, str]]] = None
+) -> asyncio.Task:
     """
     Trigger async summary job without blocking.
-    
+
     Args:
         session_id: Session to summarize
-        
+        history: In-memory conversation transcript, if still available
+
     Returns:
         Async task handle
     """
-    return asyncio.create_task(process_session_summary(session_id))
+    return asyncio.create_task(process_session_summary(session_id, history))
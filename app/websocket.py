@@ -1,24 +1,119 @@
 """
 WebSocket handler for real-time AI conversations.
 """
-import json
-from typing import Dict, List
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+import orjson
 from fastapi import WebSocket, WebSocketDisconnect
 from app.db import get_db
 from app.llm import get_llm_handler
 from app.models import SessionCreate, EventCreate, WebSocketMessage
 from app.post_session import trigger_summary_job
 
+logger = logging.getLogger(__name__)
+
+
+class TokenBuffer:
+    """
+    Coalesces streamed tokens into larger WebSocket frames.
+
+    OpenAI deltas are often only 1-4 characters; sending one frame per
+    delta wastes JSON encoding and syscalls. Tokens are buffered and
+    flushed once enough bytes accumulate or a short interval elapses,
+    which is imperceptible to the client.
+    """
+
+    FLUSH_BYTES = 48
+    FLUSH_INTERVAL = 0.02
+
+    # Precomputed frame prefix so a flush only JSON-encodes the token
+    # string itself, never an enclosing dict
+    TOKEN_PREFIX = b'{"type":"token","content":'
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.buf: List[str] = []
+        self.nbytes = 0
+        self.last_flush = time.monotonic()
+
+    async def append(self, content: str):
+        """Buffer a token, flushing if the size or time threshold is hit."""
+        self.buf.append(content)
+        self.nbytes += len(content)
+
+        if (
+            self.nbytes >= self.FLUSH_BYTES
+            or time.monotonic() - self.last_flush >= self.FLUSH_INTERVAL
+        ):
+            await self.flush()
+
+    async def flush(self):
+        """Send buffered tokens as a single frame."""
+        if self.buf:
+            await self.websocket.send_text(
+                (self.TOKEN_PREFIX + orjson.dumps("".join(self.buf)) + b"}").decode()
+            )
+            self.buf.clear()
+            self.nbytes = 0
+
+        self.last_flush = time.monotonic()
+
 
 class ConnectionManager:
     """Manages WebSocket connections and conversation state."""
     
+    # Flush a write batch after this many seconds or this many queued rows
+    WRITE_BATCH_DELAY = 0.02
+    WRITE_BATCH_SIZE = 256
+
+    # How many recent user/assistant turns to send to the model; older
+    # turns are dropped from the request payload but kept in history
+    MAX_CONTEXT_TURNS = 12
+
     def __init__(self):
         """Initialize connection manager."""
         # Store active connections and their conversation history
         self.active_connections: Dict[str, WebSocket] = {}
         self.conversation_history: Dict[str, List[Dict[str, str]]] = {}
-    
+
+        # Write-behind queue: events are batched into bulk inserts off the
+        # streaming critical path by a background worker task
+        self.write_queue: "asyncio.Queue[EventCreate]" = asyncio.Queue()
+        self._writer_task: Optional[asyncio.Task] = None
+
+    def start_writer(self):
+        """Start the background event-writer task. Called at app startup."""
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._write_worker())
+
+    async def stop_writer(self):
+        """Drain the queue and stop the writer task. Called at app shutdown."""
+        if self._writer_task is not None:
+            await self.write_queue.join()
+            self._writer_task.cancel()
+            self._writer_task = None
+
+    async def _write_worker(self):
+        """Drain queued events into bulk inserts."""
+        while True:
+            batch = [await self.write_queue.get()]
+
+            # Give the stream a moment to enqueue more rows, then drain
+            await asyncio.sleep(self.WRITE_BATCH_DELAY)
+            while not self.write_queue.empty() and len(batch) < self.WRITE_BATCH_SIZE:
+                batch.append(self.write_queue.get_nowait())
+
+            try:
+                await get_db().insert_events(batch)
+            except Exception as e:
+                logger.error(f"Error flushing event batch: {str(e)}")
+            finally:
+                for _ in batch:
+                    self.write_queue.task_done()
+
     async def connect(self, websocket: WebSocket, session_id: str):
         """
         Accept WebSocket connection and initialize session.
@@ -42,26 +137,30 @@ class ConnectionManager:
         try:
             session = SessionCreate(session_id=session_id, user_id=None)
             await get_db().create_session(session)
-            print(f"Session {session_id} created")
+            logger.info(f"Session {session_id} created")
         except Exception as e:
-            print(f"Error creating session: {str(e)}")
+            logger.error(f"Error creating session: {str(e)}")
     
-    def disconnect(self, session_id: str):
+    async def disconnect(self, session_id: str):
         """
         Remove connection and trigger post-session processing.
-        
+
         Args:
             session_id: Session identifier
         """
         if session_id in self.active_connections:
             del self.active_connections[session_id]
-        
-        if session_id in self.conversation_history:
-            del self.conversation_history[session_id]
-        
+
+        # Hand the in-memory transcript to the summary job so it does not
+        # have to refetch every event from the database
+        history = self.conversation_history.pop(session_id, None)
+
+        # Wait for queued events to land so the summary job sees all rows
+        await self.write_queue.join()
+
         # Trigger async summary job
-        trigger_summary_job(session_id)
-        print(f"Session {session_id} disconnected, summary job triggered")
+        trigger_summary_job(session_id, history)
+        logger.info(f"Session {session_id} disconnected, summary job triggered")
     
     async def handle_message(self, session_id: str, message: str):
         """
@@ -88,34 +187,50 @@ class ConnectionManager:
                 role="user",
                 content=message
             )
-            await get_db().insert_event(user_event)
+            self.write_queue.put_nowait(user_event)
             
-            # Stream LLM response
-            assistant_message = ""
+            # Stream LLM response; tokens are collected in a list and
+            # joined once to avoid quadratic string concatenation
+            assistant_parts: List[str] = []
             tool_responses = []
-            
+            token_buffer = TokenBuffer(websocket)
+
+            # Send the system prompt plus a rolling window of recent turns;
+            # sending the whole history is O(turns^2) in input tokens and
+            # dominates time-to-first-token on long sessions. Only
+            # user/assistant messages go into the window: a slice through a
+            # tool exchange could start at a role:"tool" message whose
+            # parent tool_calls message was cut off, which OpenAI rejects.
+            # Building a fresh list also keeps the tool-exchange entries
+            # stream_completion appends out of the stored history.
+            history = self.conversation_history[session_id]
+            window = 2 * self.MAX_CONTEXT_TURNS
+            chat_turns = [
+                m for m in history[1:]
+                if m.get("role") in ("user", "assistant") and m.get("content")
+            ]
+            messages = [history[0]] + chat_turns[-window:]
+
             async for event in get_llm_handler().stream_completion(
-                self.conversation_history[session_id],
+                messages,
                 session_id
             ):
                 event_type = event.get("type")
                 
                 if event_type == "token":
-                    # Stream token to client
+                    # Buffer token; frames are flushed in coalesced chunks
                     content = event.get("content", "")
-                    assistant_message += content
-                    await websocket.send_json({
-                        "type": "token",
-                        "content": content
-                    })
-                
+                    assistant_parts.append(content)
+                    await token_buffer.append(content)
+
                 elif event_type == "tool_call":
                     # Notify client about tool call
-                    await websocket.send_json({
+                    await token_buffer.flush()
+                    await websocket.send_text(orjson.dumps({
                         "type": "tool_call",
                         "tool_name": event.get("tool_name"),
                         "tool_id": event.get("tool_id")
-                    })
+                    }).decode())
                 
                 elif event_type == "tool_result":
                     # Send tool result to client
@@ -125,13 +240,14 @@ class ConnectionManager:
                         "tool_name": tool_name,
                         "content": tool_content
                     })
-                    
-                    await websocket.send_json({
+
+                    await token_buffer.flush()
+                    await websocket.send_text(orjson.dumps({
                         "type": "tool_result",
                         "tool_name": tool_name,
                         "content": tool_content
-                    })
-                    
+                    }).decode())
+
                     # Save tool result to database
                     tool_event = EventCreate(
                         session_id=session_id,
@@ -139,21 +255,24 @@ class ConnectionManager:
                         content=tool_content,
                         tool_name=tool_name
                     )
-                    await get_db().insert_event(tool_event)
+                    self.write_queue.put_nowait(tool_event)
                 
                 elif event_type == "error":
                     # Send error to client
-                    await websocket.send_json({
+                    await token_buffer.flush()
+                    await websocket.send_text(orjson.dumps({
                         "type": "error",
                         "content": event.get("content", "Unknown error")
-                    })
+                    }).decode())
                     return
                 
                 elif event_type == "done":
                     # Streaming complete
-                    await websocket.send_json({"type": "done"})
+                    await token_buffer.flush()
+                    await websocket.send_text(orjson.dumps({"type": "done"}).decode())
             
             # Add assistant message to history
+            assistant_message = "".join(assistant_parts)
             if assistant_message:
                 self.conversation_history[session_id].append({
                     "role": "assistant",
@@ -166,15 +285,15 @@ class ConnectionManager:
                     role="assistant",
                     content=assistant_message
                 )
-                await get_db().insert_event(assistant_event)
+                self.write_queue.put_nowait(assistant_event)
         
         except Exception as e:
-            print(f"Error handling message: {str(e)}")
+            logger.debug(f"Error handling message: {str(e)}")
             try:
-                await websocket.send_json({
+                await websocket.send_text(orjson.dumps({
                     "type": "error",
                     "content": f"Error processing message: {str(e)}"
-                })
+                }).decode())
             except:
                 pass
 
@@ -204,29 +323,34 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
             data = await websocket.receive_text()
             
             try:
-                message_data = json.loads(data)
-                msg = WebSocketMessage(**message_data)
-                
-                if msg.type == "message" and msg.content:
-                    await manager.handle_message(session_id, msg.content)
-                
-                elif msg.type == "ping":
-                    await websocket.send_json({"type": "pong"})
+                message_data = orjson.loads(data)
+                msg_type = message_data.get("type")
+
+                # Heartbeats arrive on a timer from every client; answer
+                # them without constructing a Pydantic model
+                if msg_type == "ping":
+                    await websocket.send_text('{"type":"pong"}')
+                    continue
+
+                if msg_type == "message":
+                    msg = WebSocketMessage.model_validate(message_data)
+                    if msg.content:
+                        await manager.handle_message(session_id, msg.content)
             
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 # Treat as plain text message
                 await manager.handle_message(session_id, data)
             
             except Exception as e:
-                print(f"Error processing message: {str(e)}")
-                await websocket.send_json({
+                logger.debug(f"Error processing message: {str(e)}")
+                await websocket.send_text(orjson.dumps({
                     "type": "error",
                     "content": f"Invalid message format: {str(e)}"
-                })
+                }).decode())
     
     except WebSocketDisconnect:
-        manager.disconnect(session_id)
-    
+        await manager.disconnect(session_id)
+
     except Exception as e:
-        print(f"WebSocket error: {str(e)}")
-        manager.disconnect(session_id)
+        logger.error(f"WebSocket error: {str(e)}")
+        await manager.disconnect(session_id)